@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, time, threading, signal, sys, traceback, zipfile, io, shutil, subprocess, shlex
+import os, time, threading, signal, sys, traceback, zipfile, zlib, io, subprocess, shlex, queue
 from datetime import datetime
 from flask import Flask, jsonify, request, render_template_string, make_response, Response, send_file
 from picamera2 import Picamera2
@@ -42,15 +42,39 @@ CONT_SAVE_FPS    = float(os.getenv("ZAKU_CONT_FPS", "3"))  # 毎秒 3 枚
 # 🔧 PCA9685 サーボ制御
 # =============================
 def clamp(v, lo, hi): return max(lo, min(hi, v))
+# 0～180° の 1° 刻みパルス幅テーブル（起動時に 1 回だけ計算）
+ANGLE_US = tuple(int(MIN_US + (MAX_US - MIN_US) * (a / 180.0)) for a in range(181))
 def angle_to_us(angle):
-    angle = clamp(angle, 0, 180)
-    return int(MIN_US + (MAX_US - MIN_US) * (angle / 180.0))
+    return ANGLE_US[clamp(int(angle + 0.5), 0, 180)]
 
 pwm = PCA9685.PCA9685(I2C_ADDR, debug=False)
 pwm.setPWMFreq(FREQ_HZ)
 
+# ---- 1 トランザクションでの PWM 書き込み（MODE1 の AI=1 自動インクリメント）----
+# setServoPulse は ON_L/ON_H/OFF_L/OFF_H を 4 回に分けて書くので、
+# ドライバの smbus を直接使って 4 バイトをブロック書き込みする
+_MODE1, _MODE1_AI, _LED0_ON_L = 0x00, 0x20, 0x06
+_bus = getattr(pwm, "bus", None)
+if _bus is not None:
+    # bit7(RESTART) は書き戻さない
+    _bus.write_byte_data(I2C_ADDR, _MODE1, (_bus.read_byte_data(I2C_ADDR, _MODE1) & 0x7F) | _MODE1_AI)
+
+def set_servo_pulse_fast(ch, us):
+    """パルス幅 us を 1 回の I2C ブロック書き込みで設定（smbus が無ければ従来 API）"""
+    if _bus is None:
+        pwm.setServoPulse(ch, us)
+        return
+    off = clamp(int(us * 4096 * FREQ_HZ / 1_000_000), 0, 4095)
+    _bus.write_i2c_block_data(I2C_ADDR, _LED0_ON_L + 4 * ch, [0, 0, off & 0xFF, off >> 8])
+
+# サーボ専用の細いロック（I2C 書き込みの直列化のみ）。cam_lock とは独立させ、
+# スナップショット中でもサーボ操作が待たされないようにする
+servo_lock = threading.Lock()
+
 def goto_angle(angle):
-    pwm.setServoPulse(SERVO_CH, angle_to_us(angle))
+    us = angle_to_us(angle)
+    with servo_lock:
+        set_servo_pulse_fast(SERVO_CH, us)
 
 # =============================
 # 📷 Picamera2 設定
@@ -66,15 +90,33 @@ still_config = picam2.create_still_configuration(
 )
 
 class StreamingOutput(io.BufferedIOBase):
-    """MJPEG フレームの最新 1 枚を保持し、購読者へ通知する簡易出力。"""
+    """MJPEG フレームの最新 1 枚を保持し、購読者ごとの Event で通知する簡易出力。
+    共有 Condition を使わないので、書き込み側はロックを取らずに済む。"""
     def __init__(self):
         self.frame = None
-        self.condition = threading.Condition()
+        self.seq = 0                         # write() 毎に +1（遅いクライアントの取りこぼし検出用）
+        self._subs = ()                      # copy-on-write（write() はロック不要で参照）
+        self._subs_lock = threading.Lock()
     def write(self, buf: bytes):
         if not buf: return
-        with self.condition:
-            self.frame = buf
-            self.condition.notify_all()
+        self.seq += 1
+        self.frame = buf                     # 参照の代入は GIL 下でアトミック
+        for ev in self._subs:
+            ev.set()
+    def subscribe(self):
+        ev = threading.Event()
+        with self._subs_lock:
+            self._subs = self._subs + (ev,)
+        return ev
+    def unsubscribe(self, ev):
+        with self._subs_lock:
+            self._subs = tuple(e for e in self._subs if e is not ev)
+    def wait_frame(self, ev, timeout):
+        """次のフレーム（タイムアウト時は直近のフレーム）を (seq, frame) で返す。
+        常に最新の 1 枚だけを渡すので、送信が詰まったクライアントは自然にフレームを飛ばす。"""
+        ev.wait(timeout)
+        ev.clear()
+        return self.seq, self.frame
 
 output = StreamingOutput()
 cam_lock = threading.Lock()
@@ -108,7 +150,15 @@ app = Flask(__name__)
 
 @app.after_request
 def add_no_cache_headers(resp):
-    # すべて no-store（Safari/Chrome のキャッシュ抑止）
+    endpoint = request.endpoint
+    # MJPEG ストリームは 1 回きりの長時間レスポンスなのでキャッシュ指定は不要
+    if endpoint == "stream_mjpg":
+        return resp
+    # 静止画は ETag を残して毎回再検証させる（変化が無ければ 304 で本体を送らない）
+    if endpoint == "image":
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    # それ以外は no-store（Safari/Chrome のキャッシュ抑止）
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
@@ -139,7 +189,24 @@ NAS_HOST = os.getenv("ZAKU_NAS_HOST", "nas01.local")  # もしくは IP
 NAS_PATH = os.getenv("ZAKU_NAS_PATH", "/mnt/storage/cam_uploads/incoming/")
 RSYNC_BIN = os.getenv("ZAKU_RSYNC_BIN", "/usr/bin/rsync")
 SSH_KEY   = os.getenv("ZAKU_SSH_KEY", "/home/piuser/.ssh/id_ed25519")
-SSH_OPTS  = f"-o BatchMode=yes -o StrictHostKeyChecking=no -o ConnectTimeout=5 -i {SSH_KEY}"
+# ControlMaster で SSH 接続を使い回し、ZIP 毎の鍵交換/認証を省く
+_RUN_DIR  = f"/run/user/{os.getuid()}"
+SSH_CTL   = os.getenv("ZAKU_SSH_CONTROL_PATH",
+                      os.path.join(_RUN_DIR if os.path.isdir(_RUN_DIR) else "/tmp", "zaku-%r@%h:%p"))
+SSH_OPTS  = (f"-o BatchMode=yes -o StrictHostKeyChecking=no -o ConnectTimeout=5 -i {SSH_KEY}"
+             f" -o ControlMaster=auto -o ControlPath={SSH_CTL} -o ControlPersist=10m")
+
+def start_ssh_master():
+    """初回アップロード前に多重化用のマスター接続をバックグラウンドで張っておく。"""
+    cmd = ["ssh", *shlex.split(SSH_OPTS), "-MNf", f"{NAS_USER}@{NAS_HOST}"]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
+        if res.returncode == 0:
+            print(f"[upload] ssh master ready -> {NAS_HOST}")
+        else:
+            print(f"[upload] ssh master failed rc={res.returncode}: {res.stderr.strip()}")
+    except Exception as e:
+        print("[upload] ssh master error:", e)
 
 def upload_to_nas(zip_path, retries=1):
     """ZIP を NAS へ送る。成功なら True"""
@@ -165,44 +232,80 @@ def upload_to_nas(zip_path, retries=1):
             time.sleep(2)
     return False
 
+# キャプチャスレッドを止めないよう、アップロードは別スレッドで順次処理する
+# （キューが満杯なら put がブロックし、NAS が遅い時の背圧になる）
+UPLOAD_QUEUE_MAX = int(os.getenv("ZAKU_UPLOAD_QUEUE", "4"))
+upload_q = queue.Queue(maxsize=UPLOAD_QUEUE_MAX)
+
+def uploader_worker():
+    """upload_q から ZIP パスを取り出して NAS へ送る。"""
+    while True:
+        zip_path = upload_q.get()
+        try:
+            ok = upload_to_nas(zip_path)
+            print(f"[upload] {'uploaded' if ok else 'upload failed'} -> {zip_path}")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            upload_q.task_done()
+
+threading.Thread(target=uploader_worker, daemon=True).start()
+
 # =============================
 # 📦 連続キャプチャとZIP保存（勾選で開始/取消で停止）
 # =============================
 CONT_RUNNING = threading.Event()
 
-def _save_session_from_mjpeg(session_dir, duration_sec, save_fps):
-    """指定 duration_sec の間、MJPEG の最新フレームを save_fps で JPEG 保存。"""
-    os.makedirs(session_dir, exist_ok=True)
+def _save_session_from_mjpeg(zf, duration_sec, save_fps):
+    """指定 duration_sec の間、MJPEG の最新フレームを save_fps でセッション ZIP へ追記。
+    フレームは個別ファイルにせず、ZIP はセッション単位で 1 回だけ開く。"""
     end_time = time.time() + duration_sec
-    next_save = 0.0
+    # PREVIEW_FPS で届くフレームのうち stride 枚に 1 枚だけ保存する（時刻比較は不要）
+    stride = max(1, round(PREVIEW_FPS / max(0.5, float(save_fps))))
+    counter = 0
     saved = 0
-    while time.time() < end_time and CONT_RUNNING.is_set():
-        with output.condition:
-            output.condition.wait(timeout=0.5)
+    ev = output.subscribe()
+    try:
+        while time.time() < end_time and CONT_RUNNING.is_set():
+            if not ev.wait(timeout=0.5):
+                continue
+            ev.clear()
+            counter += 1
+            if counter % stride:
+                continue
             frame = output.frame
-        if frame is None:
-            continue
-        now = time.time()
-        if now < next_save:
-            continue
-        next_save = now + (1.0 / max(0.5, float(save_fps)))
-        fn = os.path.join(session_dir, f"{int(time.time()*1000)}.jpg")
-        try:
-            with open(fn, "wb") as f:
-                f.write(frame)
-            saved += 1
-        except Exception as e:
-            print("[cont] write failed:", e)
+            if frame is None:
+                continue
+            now = time.time()
+            zi = zipfile.ZipInfo(f"{int(now*1000)}.jpg", date_time=time.localtime(now)[:6])
+            zi.compress_type = zipfile.ZIP_STORED
+            try:
+                zf.writestr(zi, frame)
+                saved += 1
+            except Exception as e:
+                print("[cont] write failed:", e)
+    finally:
+        output.unsubscribe(ev)
     return saved
 
-def _zip_and_cleanup(session_dir, zip_path):
-    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for fn in sorted(os.listdir(session_dir)):
-            zf.write(os.path.join(session_dir, fn), arcname=fn)
-    try:
-        shutil.rmtree(session_dir)
-    except Exception:
-        pass
+_deflate_ratio_logged = False
+
+def _log_deflate_ratio_once(data):
+    """初回だけ、JPEG を deflate（ZIP_DEFLATED 既定の level 6）した場合の圧縮率をログに残す"""
+    global _deflate_ratio_logged
+    if _deflate_ratio_logged or not data:
+        return
+    _deflate_ratio_logged = True
+    ratio = len(zlib.compress(data, 6)) / len(data)
+    print(f"[cont] deflate ratio on a JPEG frame: {ratio:.3f} ({len(data)} bytes) → ZIP_STORED")
+
+def _zip_and_cleanup(zf, zip_path):
+    """セッション ZIP を閉じて（central directory を書き出し）最終名へリネーム。
+    中身は既に圧縮済みの JPEG なので deflate せず ZIP_STORED で格納している。"""
+    part_path = zf.filename
+    zf.close()
+    os.replace(part_path, zip_path)
+    _log_deflate_ratio_once(output.frame)   # 最新フレームで代表値を取る
 
 def cont_worker():
     """ON の間、パックをループ生成。OFF 指示で終了。"""
@@ -210,14 +313,16 @@ def cont_worker():
     try:
         while CONT_RUNNING.is_set():
             label = datetime.now().strftime("%Y%m%d-%H%M%S")
-            session_dir = os.path.join(CAPTURE_DIR, f"session-{label}")
-            zip_path    = os.path.join(CAPTURE_DIR, f"{label}.zip")
+            part_path = os.path.join(CAPTURE_DIR, f"session-{label}.zip")
+            zip_path  = os.path.join(CAPTURE_DIR, f"{label}.zip")
             print(f"[cont] capture {label} ...")
-            saved = _save_session_from_mjpeg(session_dir, CONT_SESSION_SEC, CONT_SAVE_FPS)
-            _zip_and_cleanup(session_dir, zip_path)
+            zf = zipfile.ZipFile(part_path, 'w', compression=zipfile.ZIP_STORED)
+            try:
+                saved = _save_session_from_mjpeg(zf, CONT_SESSION_SEC, CONT_SAVE_FPS)
+            finally:
+                _zip_and_cleanup(zf, zip_path)
             print(f"[cont] saved {saved} frames -> {zip_path}")
-            ok = upload_to_nas(zip_path)
-            print(f"[cont] {'uploaded' if ok else 'upload failed'} -> {zip_path}")
+            upload_q.put(zip_path)
     finally:
         print("[cont] stopped")
 
@@ -244,33 +349,27 @@ def cont_status():
 # =============================
 CRUISE_ONE_WAY_SEC = 10.0
 CRUISE_END_PAUSE   = 0.5
+CRUISE_STEPS       = 50      # 片道あたりのサーボ更新回数（I2C 書き込み回数）
 SWEEP_RUNNING = threading.Event()
 
+def _sweep_leg(start_deg, end_deg):
+    """start_deg→end_deg を CRUISE_ONE_WAY_SEC かけて移動。monotonic の締切まで sleep する。"""
+    dt = CRUISE_ONE_WAY_SEC / CRUISE_STEPS
+    span = end_deg - start_deg
+    t0 = time.monotonic()
+    for i in range(CRUISE_STEPS):
+        if not SWEEP_RUNNING.is_set(): break
+        goto_angle(start_deg + span * (i / CRUISE_STEPS))
+        time.sleep(max(0.0, t0 + (i + 1) * dt - time.monotonic()))
+    goto_angle(end_deg); time.sleep(CRUISE_END_PAUSE)
+
 def sweep_worker():
     """左→右 10秒、停止、右→左 10秒、停止…を繰り返す。"""
     print("[sweep] started")
     try:
         while SWEEP_RUNNING.is_set():
-            # 左→右
-            t0 = time.time()
-            while SWEEP_RUNNING.is_set():
-                el = time.time() - t0
-                if el >= CRUISE_ONE_WAY_SEC: break
-                ratio = el / CRUISE_ONE_WAY_SEC
-                angle = LEFT_DEG + (RIGHT_DEG - LEFT_DEG) * ratio
-                goto_angle(angle)
-                time.sleep(0.05)
-            goto_angle(RIGHT_DEG); time.sleep(CRUISE_END_PAUSE)
-            # 右→左
-            t0 = time.time()
-            while SWEEP_RUNNING.is_set():
-                el = time.time() - t0
-                if el >= CRUISE_ONE_WAY_SEC: break
-                ratio = el / CRUISE_ONE_WAY_SEC
-                angle = RIGHT_DEG - (RIGHT_DEG - LEFT_DEG) * ratio
-                goto_angle(angle)
-                time.sleep(0.05)
-            goto_angle(LEFT_DEG); time.sleep(CRUISE_END_PAUSE)
+            _sweep_leg(LEFT_DEG, RIGHT_DEG)   # 左→右
+            _sweep_leg(RIGHT_DEG, LEFT_DEG)   # 右→左
     finally:
         print("[sweep] stopped")
 
@@ -329,7 +428,7 @@ INDEX_HTML = """
 <img id="live" src="/stream.mjpg?pin={{pin|e}}" alt="live">
 
 <h4>Last Snapshot</h4>
-<img id="still" src="/image/latest.jpg?ts={{ts}}" alt="latest still">
+<img id="still" src="/image/latest.jpg" alt="latest still">
 
 <div class="status" id="status">Ready.</div>
 
@@ -353,10 +452,16 @@ const clMax      = document.getElementById('clMax');
 const pillCont   = document.getElementById('pillCont');
 const pillCruise = document.getElementById('pillCruise');
 
-function refreshStill(){
-  const u=new URL(stillEl.src, window.location.origin);
-  u.searchParams.set('ts', Date.now());
-  stillEl.src=u.toString();
+let stillBlobUrl=null;
+async function refreshStill(){
+  // URL は固定（キャッシュバスターなし）。Cache-Control: no-cache によりブラウザが
+  // If-None-Match 付きで再検証し、変化がなければ 304 で本体を再送しない
+  const r=await fetch('/image/latest.jpg');
+  if(!r.ok) return;
+  const url=URL.createObjectURL(await r.blob());
+  stillEl.src=url;
+  if(stillBlobUrl) URL.revokeObjectURL(stillBlobUrl);
+  stillBlobUrl=url;
 }
 
 function syncSliderByDir(dir){
@@ -394,7 +499,7 @@ async function snap(){
     const r=await fetch('/api/snapshot');
     const j=await r.json();
     statusEl.textContent=j.message||'Captured';
-    if(j.ok!==False) refreshStill();
+    if(j.ok!==false) await refreshStill();
   }catch(e){ statusEl.textContent='Capture failed'; }
 }
 
@@ -447,11 +552,18 @@ pollHealth();
 def index():
     # index は PIN 必須なので、テンプレに渡し直して img のクエリへ再付与
     pin = request.args.get("pin", "")
-    return render_template_string(INDEX_HTML, ts=int(time.time()), pin=pin)
+    return render_template_string(INDEX_HTML, pin=pin)
 
 # =============================
 # 📡 Stream & API
 # =============================
+# 遅いクライアントが連続で取りこぼしてよいフレーム数（既定: 約 5 秒分）
+STREAM_MAX_SKIP = int(os.getenv("ZAKU_STREAM_MAX_SKIP", str(PREVIEW_FPS * 5)))
+# 送信が完全に止まったクライアント（Wi-Fi 切断等で ACK が返らない）を切るまでの秒数（gunicorn 下のみ有効）
+STREAM_SEND_TIMEOUT = float(os.getenv("ZAKU_STREAM_SEND_TIMEOUT", "10"))
+MJPEG_PART_HEAD = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+MJPEG_PART_TAIL = b"\r\n"
+
 @app.get("/stream.mjpg")
 def stream_mjpg():
     global active_clients
@@ -460,22 +572,37 @@ def stream_mjpg():
             return Response("Too many clients", status=503)
         active_clients += 1
     print(f"[stream] client connected ({active_clients}/{MAX_CLIENTS})")
+    # gunicorn はクライアントのソケットを environ に渡す。送信タイムアウトを付けておくと
+    # 送信が詰まったまま STREAM_SEND_TIMEOUT 秒経過した時点で例外 → 接続が閉じられ gen() も close される
+    sock = request.environ.get("gunicorn.socket")
+    if sock is not None and STREAM_SEND_TIMEOUT > 0:
+        sock.settimeout(STREAM_SEND_TIMEOUT)
 
     def gen():
         global active_clients  # ← modify global safely
+        ev = output.subscribe()
+        last_seq = output.seq
         try:
             while True:
-                with output.condition:
-                    output.condition.wait(timeout=1.0)
-                    frame = output.frame
+                seq, frame = output.wait_frame(ev, timeout=1.0)
                 if frame is None: continue
-                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+                # 送信ブロック中に連続で飛ばしたフレーム数が上限を超えたら切断
+                skipped = seq - last_seq - 1
+                last_seq = seq
+                if skipped > STREAM_MAX_SKIP:
+                    print(f"[stream] client too slow (skipped {skipped} frames), disconnecting")
+                    return
+                # 連結せずに分けて yield（クライアント毎・フレーム毎の大きな bytes 生成を避ける）
+                yield MJPEG_PART_HEAD
+                yield frame
+                yield MJPEG_PART_TAIL
         except (BrokenPipeError, ConnectionResetError, GeneratorExit):
             # client closed connection — normal
             pass
         except Exception as e:
             print("[stream] client error:", e)
         finally:
+            output.unsubscribe(ev)
             with clients_lock:
                 active_clients = max(0, active_clients - 1)
                 print(f"[stream] client disconnected ({active_clients}/{MAX_CLIENTS})")
@@ -506,27 +633,51 @@ def api_angle():
     except Exception as e:
         traceback.print_exc(); return jsonify(ok=False, error=str(e)), 500
 
+SNAP_SETTLE_MAX_FRAMES = 8     # AE 収束待ちの上限フレーム数
+SNAP_SETTLE_TOL        = 0.02  # 前フレーム比でこの割合以内なら収束とみなす
+
+def _wait_ae_settled():
+    """モード切替直後、ExposureTime/AnalogueGain が前フレームとほぼ同じになるまで
+    メタデータだけを受け取って待つ（明るい場面なら 1～2 フレームで抜ける）。"""
+    prev = None
+    for _ in range(SNAP_SETTLE_MAX_FRAMES):
+        md = picam2.capture_metadata()
+        if md.get("AeLocked"):
+            return
+        cur = (md.get("ExposureTime") or 0, md.get("AnalogueGain") or 0.0)
+        if prev is not None and all(abs(c - p) <= SNAP_SETTLE_TOL * max(abs(p), 1e-6)
+                                    for c, p in zip(cur, prev)):
+            return
+        prev = cur
+
 @app.get("/api/snapshot")
 def api_snapshot():
     # 連続撮影ON中は不可
     if CONT_RUNNING.is_set():
         return jsonify(ok=False, message="Disabled in continuous mode"), 400
     path = os.path.join(IMG_DIR, LATEST_IMG)
+    tmp = f"{path}.tmp_{int(time.time()*1000)}.jpg"  # .jpg 必須
     try:
         with cam_lock:
-            stop_video_stream()
-            picam2.configure(still_config)
-            picam2.start()
-            time.sleep(0.08)
-            tmp = f"{path}.tmp_{int(time.time()*1000)}.jpg"  # .jpg 必須
-            picam2.capture_file(tmp)                         # quality kw 非対応
-            os.replace(tmp, path)
-            picam2.stop()
-            start_video_stream()
+            # カメラは止めずにエンコーダだけ一時停止（still 解像度のフレームを MJPEG に流さない）
+            picam2.stop_encoder()
+            try:
+                # still へはモード切替のみ（configure/start の往復なし）
+                picam2.switch_mode(still_config)
+                try:
+                    _wait_ae_settled()                 # 固定 sleep ではなく AE の収束を待つ
+                    picam2.capture_file(tmp)           # quality kw 非対応
+                finally:
+                    picam2.switch_mode(video_config)
+            finally:
+                picam2.start_encoder(MJPEGEncoder(), FileOutput(output))
+        os.replace(tmp, path)
         return jsonify(ok=True, message="Snapshot saved (HQ).")
     except Exception as e:
         traceback.print_exc()
-        try: start_video_stream()
+        try:
+            stop_video_stream()
+            start_video_stream()
         except Exception: pass
         return jsonify(ok=False, error=str(e)), 500
 
@@ -534,7 +685,9 @@ def api_snapshot():
 def image(name):
     p = os.path.join(IMG_DIR, name)
     if not os.path.isfile(p): return jsonify(ok=False, error="not found"), 404
-    return make_response(send_file(p, mimetype="image/jpeg", conditional=False))
+    # conditional=True: If-Modified-Since/Range に 304/206 で応答。本体は wsgi.file_wrapper
+    # （gunicorn では sendfile）経由で送られ、Python 側でのコピーが発生しない
+    return make_response(send_file(p, mimetype="image/jpeg", conditional=True))
 
 @app.get("/health")
 def health():
@@ -562,10 +715,16 @@ def _graceful_exit(signum=None, frame=None):
 signal.signal(signal.SIGTERM, _graceful_exit)
 signal.signal(signal.SIGINT,  _graceful_exit)
 
+def startup():
+    """サーバ起動前の初期化（サーボ中央 + SSH マスター接続）"""
+    goto_angle(CENTER_DEG)
+    threading.Thread(target=start_ssh_master, daemon=True).start()
+    print(f"Serving on http://0.0.0.0:8080/?pin={VIEW_PIN}")
+
 if __name__ == "__main__":
+    # デバッグ用（本番は wsgi.py 経由で gunicorn から起動する）
     try:
-        goto_angle(CENTER_DEG)
-        print(f"Serving on http://0.0.0.0:8080/?pin={VIEW_PIN}")
+        startup()
         app.run(host="0.0.0.0", port=8080, threaded=True)
     finally:
         _graceful_exit()
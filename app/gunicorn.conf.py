@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# gunicorn 設定（gunicorn -c gunicorn.conf.py wsgi:app）
+# ・threads は MJPEG の同時接続上限 ZAKU_MAX_CLIENTS（app.py と同じ既定 5）+ API 用の 2
+#   → ストリームが上限まで埋まっても / や /api/* は処理できる
+# ・コマンドラインの --threads は本ファイルより優先されるので付けないこと
+import os
+
+bind = "0.0.0.0:8080"
+worker_class = "gthread"
+workers = 1
+threads = int(os.getenv("ZAKU_MAX_CLIENTS", "5")) + 2
+timeout = 0
@@ -7,6 +7,11 @@ import logging
 import tempfile
 import shutil
 
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # 未導入ならポーリングのみで動作
+    INotify = None
+
 BASE_DIR = "/mnt/nvme0/cam_uploads"
 INCOMING = f"{BASE_DIR}/incoming"
 PROCESSED = f"{BASE_DIR}/processed"
@@ -23,17 +28,27 @@ logging.basicConfig(
 )
 
 MTIME_STABLE_SEC = 15   # 最終更新から15秒以上経過したファイルのみ処理する
-SLEEP_INTERVAL   = 10   # 各スキャンの間隔（秒）
+SLEEP_INTERVAL   = 10   # 各スキャンの間隔（秒）※inotify が使えない場合のみ
+RESCAN_INTERVAL  = 600  # inotify 使用時の保険の全体スキャン間隔（秒）：失敗したzipの再試行用
+
+EXTRACT_BUFSIZE  = 1 << 20  # 解凍時の読み書きバッファ（1 MiB）
 
 def safe_extract(zipf: zipfile.ZipFile, dest_dir: str) -> None:
-    """zip-slip防止：すべてのファイルをdest_dir以下に解凍することを保証"""
+    """zip-slip防止：すべてのファイルをdest_dir以下に解凍することを保証
+    安全確認と解凍を同じ 1 回の走査で行い、大きめのバッファでコピーする
+    （途中で拒否した場合も dest_dir は呼び出し側の一時ディレクトリなので破棄される）"""
+    root = os.path.realpath(dest_dir)
     for member in zipf.infolist():
         # 絶対パスや上位ディレクトリへの脱出を拒否する
         target_path = os.path.realpath(os.path.join(dest_dir, member.filename))
-        if not target_path.startswith(os.path.realpath(dest_dir) + os.sep) and \
-           target_path != os.path.realpath(dest_dir):
+        if not target_path.startswith(root + os.sep) and target_path != root:
             raise RuntimeError(f"Unsafe path in zip: {member.filename}")
-    zipf.extractall(dest_dir)
+        if member.is_dir():
+            os.makedirs(target_path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with zipf.open(member) as src, open(target_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=EXTRACT_BUFSIZE)
 
 def process_one_zip(zip_path: str) -> None:
     base_name = os.path.basename(zip_path).rsplit(".zip", 1)[0]
@@ -63,44 +78,97 @@ def process_one_zip(zip_path: str) -> None:
     os.remove(zip_path)
     logging.info(f"Extracted {os.path.basename(zip_path)} -> {final_dir}")
 
+def try_process(zip_path: str) -> None:
+    try:
+        process_one_zip(zip_path)
+    except zipfile.BadZipFile as e:
+        logging.error(f"Bad zip file {zip_path}: {e}")
+        # 任意：隔離(quarantine)ディレクトリへ移動することも可能
+        # 現状では手動確認のため元ファイルを保持
+    except Exception as e:
+        logging.error(f"Failed to process {zip_path}: {e}")
+
+def scan_incoming() -> None:
+    """INCOMING を一巡し、mtime が安定した zip を処理する"""
+    now = time.time()
+    try:
+        # scandirを使用するとlistdirより効率的で、statも直接取得可能
+        with os.scandir(INCOMING) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                name = entry.name
+                if not name.endswith(".zip"):
+                    continue
+
+                zip_path = entry.path
+
+                # mtime安定確認：rsyncなどによるリネーム完了を保証
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    # 同時に削除や移動された場合（競合）、無視して次へ
+                    continue
+
+                if now - mtime < MTIME_STABLE_SEC:
+                    continue
+
+                try_process(zip_path)
+
+    except Exception as e:
+        logging.error(f"Scan loop error: {e}")
+
+def watch_incoming() -> None:
+    """inotify で到着した zip だけを処理する。待機中はシステムコールなしでブロック。
+    rsync は一時名で書いてから rename するので IN_MOVED_TO（直接書き込みは IN_CLOSE_WRITE）を見る。"""
+    inotify = INotify()
+    inotify.add_watch(INCOMING, flags.CLOSE_WRITE | flags.MOVED_TO)
+    pending = {}  # name -> 処理予定時刻（monotonic）。同名イベントが来るたびに延長
+    # watch 登録後に一度だけ既存ファイルを拾う（停止中に届いていた分のクラッシュリカバリ）
+    with os.scandir(INCOMING) as it:
+        for entry in it:
+            if entry.name.endswith(".zip") and entry.is_file():
+                pending[entry.name] = time.monotonic()
+    next_rescan = time.monotonic() + RESCAN_INTERVAL
+    while True:
+        now = time.monotonic()
+        deadline = min([next_rescan, *pending.values()])
+        for ev in inotify.read(timeout=max(0, int((deadline - now) * 1000))):
+            if ev.mask & flags.Q_OVERFLOW:
+                logging.warning("inotify queue overflow, rescanning")
+                scan_incoming()
+                continue
+            if ev.name.endswith(".zip"):
+                pending[ev.name] = time.monotonic() + MTIME_STABLE_SEC
+
+        now = time.monotonic()
+        for name in [n for n, t in pending.items() if t <= now]:
+            del pending[name]
+            zip_path = os.path.join(INCOMING, name)
+            try:
+                age = time.time() - os.stat(zip_path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age < MTIME_STABLE_SEC:
+                pending[name] = now + (MTIME_STABLE_SEC - age)
+                continue
+            try_process(zip_path)
+
+        if now >= next_rescan:
+            scan_incoming()
+            next_rescan = now + RESCAN_INTERVAL
+
 def main():
     logging.info("Receiver started")
-    while True:
-        now = time.time()
+    if INotify is not None:
         try:
-            # scandirを使用するとlistdirより効率的で、statも直接取得可能
-            with os.scandir(INCOMING) as it:
-                for entry in it:
-                    if not entry.is_file():
-                        continue
-                    name = entry.name
-                    if not name.endswith(".zip"):
-                        continue
-
-                    zip_path = entry.path
-
-                    # mtime安定確認：rsyncなどによるリネーム完了を保証
-                    try:
-                        mtime = entry.stat().st_mtime
-                    except FileNotFoundError:
-                        # 同時に削除や移動された場合（競合）、無視して次へ
-                        continue
-
-                    if now - mtime < MTIME_STABLE_SEC:
-                        continue
-
-                    try:
-                        process_one_zip(zip_path)
-                    except zipfile.BadZipFile as e:
-                        logging.error(f"Bad zip file {zip_path}: {e}")
-                        # 任意：隔離(quarantine)ディレクトリへ移動することも可能
-                        # 現状では手動確認のため元ファイルを保持
-                    except Exception as e:
-                        logging.error(f"Failed to process {zip_path}: {e}")
-
+            watch_incoming()
         except Exception as e:
-            logging.error(f"Scan loop error: {e}")
-
+            logging.error(f"inotify watch failed, falling back to polling: {e}")
+    else:
+        logging.info(f"inotify_simple not installed, polling every {SLEEP_INTERVAL}s")
+    while True:
+        scan_incoming()
         time.sleep(SLEEP_INTERVAL)
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# gunicorn エントリポイント:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# ・ワーカーは 1 つ（picam2 / output はプロセス内シングルトンなので IPC なしで共有）
+# ・bind / gthread / threads / timeout は gunicorn.conf.py で設定
+#   threads = ZAKU_MAX_CLIENTS + 2（ストリーム上限 + API 用の余裕）
+# ・MJPEG ストリームは意図的に長時間つながるので timeout = 0
+from app import app, startup
+
+startup()
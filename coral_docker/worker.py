@@ -1,12 +1,34 @@
 #!/usr/bin/env python3
-import os, sys, csv, json, time, signal, shutil, traceback, subprocess, shlex
+import os, sys, csv, json, time, signal, shutil, traceback, queue, threading, atexit, base64
 from pathlib import Path
 from datetime import datetime
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 from PIL import Image
-from pycoral.adapters import detect, common
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pycoral.adapters import detect
 from pycoral.utils.dataset import read_label_file
 from pycoral.utils.edgetpu import make_interpreter, list_edge_tpus
 
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # 未安裝時退回輪詢（每 SLEEP_SEC 掃描一次）
+    INotify = None
+
+try:
+    import cv2        # 有安裝時以 OpenCV 解碼/縮放，直接寫進輸入緩衝區
+except ImportError:   # 未安裝時使用 PIL
+    cv2 = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TJ = TurboJPEG()   # 找不到 libturbojpeg 時會丟例外
+except Exception:     # 未安裝時 JPEG 也交給 cv2/PIL 解碼
+    _TJ = None
+
 # ======== 基本設定 ========
 MODEL_PATH   = os.environ.get("MODEL",  "/app/test_data/model.tflite")
 LABELS_PATH  = os.environ.get("LABELS", "/app/test_data/coco_labels.txt")
@@ -15,21 +37,39 @@ EVENTS_ROOT  = Path(os.environ.get("EVENTS_ROOT", "/events"))  # 偵測到 perso
 LOGS_ROOT    = Path(os.environ.get("LOGS_ROOT", "/logs"))
 THRESHOLD    = float(os.environ.get("THRESHOLD", "0.3"))
 SLEEP_SEC    = int(os.environ.get("SLEEP_SEC", "10"))
+RESCAN_SEC   = int(os.environ.get("RESCAN_SEC", "300"))        # inotify 模式下，無事件時的保險全掃描間隔
 STABLE_SEC   = int(os.environ.get("STABLE_SEC", "15"))         # 批次目錄內最近檔案 mtime 穩定時間
 STATE_PATH   = Path(os.environ.get("STATE_PATH", "/logs/worker_state.json"))
 DEBUG        = os.environ.get("DEBUG", "0") == "1"
 MIN_IMAGES   = int(os.environ.get("MIN_IMAGES", "1"))          # 每批最少張數才處理
+CSV_STRICT   = os.environ.get("CSV_STRICT", "0") == "1"     # 1=每一列都經 csv.writer（預設只有含特殊字元的名稱才經過）
+DETECT_MARK_EXT = os.environ.get("DETECT_MARK_EXT", ".det")    # 偵測結果的 sidecar 標記（同 .upl 的作法）
+EARLY_EXIT   = os.environ.get("EARLY_EXIT", "0") == "1"     # 1=第一張 PERSON 即停止推論（只需決定搬移時）；其餘影像記為 SKIPPED、不上傳
+TILE_GRID    = int(os.environ.get("TILE_GRID", "1"))           # >1 時把 grid×grid 張影像拼成一個輸入、一次 invoke（每張解析度變為 1/grid）
 
 # ======== 上傳設定（Google Drive Web App） ========
-GAS_UPLOAD_URL   = os.environ.get("GAS_UPLOAD_URL", "")        # 你的 /exec URL（必填）
-GAS_UPLOAD_HELPER = os.environ.get("GAS_UPLOAD_HELPER", "/usr/local/bin/zaku02_upload_drive.sh")
+GAS_UPLOAD_URL   = os.environ.get("GAS_UPLOAD_URL", "").strip()  # 你的 /exec URL（必填）；strip 去掉 Windows 編輯留下的 CR
+UPLOAD_TIMEOUT   = float(os.environ.get("UPLOAD_TIMEOUT", "30"))
+UPLOAD_WORKERS   = int(os.environ.get("UPLOAD_WORKERS", "4"))   # 同時上傳數（HTTPS 延遲主導，少量並行即可接近線性加速）
 UPLOAD_MARK_EXT  = os.environ.get("UPLOAD_MARK_EXT", ".upl")   # 成功上傳後的 sidecar 標記
 UPLOAD_RETRIES   = int(os.environ.get("UPLOAD_RETRIES", "3"))
 UPLOAD_ENABLED   = os.environ.get("UPLOAD_ENABLED", "1") == "1"
 
 IMG_EXTS = {".jpg", ".jpeg", ".png"}
+IMG_SUFFIXES = tuple(IMG_EXTS)   # 給 str.endswith 用（小寫）
+_SUFFIX_TAIL = max(map(len, IMG_EXTS))
+
+def _has_suffix(name: str, suffixes) -> bool:
+    """不分大小寫的副檔名比對；只 lower() 檔名最後幾個字元，不必 lower() 整個檔名"""
+    return name[-_SUFFIX_TAIL:].lower().endswith(suffixes)
+DIR_MTIME_SLACK = 2.0            # 秒；目錄 mtime 與其中最新影像 mtime 可能的落差
 _running = True
 
+# ======== Interpreter（整個 process 只載入一次；USB TPU 重新載入模型代價極高）========
+_ENGINES = []         # 每個 EdgeTPU 一組 (interpreter, interpreter.tensor(input_index))
+_IN_SIZE = None       # (w, h)；所有 TPU 使用同一個模型
+# tensor accessor 每次呼叫取得新的 view（view 不可跨 invoke 持有）
+
 def log(msg):  print(f"[INFO] {msg}", flush=True)
 def warn(msg): print(f"[WARN] {msg}", file=sys.stderr, flush=True)
 def err(msg):  print(f"[ERROR] {msg}", file=sys.stderr, flush=True)
@@ -40,89 +80,468 @@ def _sigterm(_s, _f):
 signal.signal(signal.SIGTERM, _sigterm)
 signal.signal(signal.SIGINT, _sigterm)
 
+_DIR_CACHE: set = set()   # 本 process 已建立過的目錄（這些目錄由 worker 自己管理）
+
 def ensure_dir(p: Path):
+    if p in _DIR_CACHE:
+        return p
     p.mkdir(parents=True, exist_ok=True)
+    _DIR_CACHE.add(p)
     return p
 
+_LAST_WRITTEN_STATE = None   # 最後一次寫入（或讀入）的 state；內容相同就不重寫
+
 def read_state():
+    global _LAST_WRITTEN_STATE
     try:
-        return json.loads(STATE_PATH.read_text())
+        state = json.loads(STATE_PATH.read_text())
     except Exception:
         return {}
+    _LAST_WRITTEN_STATE = dict(state)
+    return state
 
 def write_state(state: dict):
+    """內容沒變就不寫；有變時先寫 .tmp 再 os.replace，當機也不會留下寫一半的 state。"""
+    global _LAST_WRITTEN_STATE
+    if state == _LAST_WRITTEN_STATE:
+        return
+    tmp = STATE_PATH.with_suffix(".tmp")
     try:
-        STATE_PATH.write_text(json.dumps(state, ensure_ascii=False, indent=2))
+        tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2))
+        os.replace(tmp, STATE_PATH)
     except Exception as e:
         warn(f"Failed to write state: {e}")
+        return
+    _LAST_WRITTEN_STATE = dict(state)
 
 def list_images(folder: Path):
+    """處理用的影像清單（依檔名排序，CSV 順序固定）。檔案類型取自 DirEntry，不逐檔 stat。"""
     try:
-        imgs = [p for p in folder.iterdir()
-                if p.is_file() and p.suffix.lower() in IMG_EXTS]
+        with os.scandir(folder) as it:
+            names = [e.name for e in it
+                     if _has_suffix(e.name, IMG_SUFFIXES) and e.is_file()]
     except FileNotFoundError:
         return []
-    return sorted(imgs)
+    names.sort()
+    return [folder / n for n in names]
 
-def newest_image_mtime(folder: Path) -> float:
-    newest = 0.0
-    for p in list_images(folder):
-        m = p.stat().st_mtime
-        if m > newest:
-            newest = m
-    return newest
+def _scan_folder(folder) -> tuple:
+    """
+    以一次 os.scandir 取得 (影像張數, 最新影像 mtime)。
+    DirEntry 已帶有檔案類型，stat 也只在 DirEntry 上做一次（不重複列目錄、不建立 Path）。
+    與 list_images 相同：符號連結指向的檔案也算（跟隨連結）。
+    """
+    count, newest = 0, 0.0
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not _has_suffix(entry.name, IMG_SUFFIXES):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    m = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                count += 1
+                if m > newest:
+                    newest = m
+    except FileNotFoundError:
+        pass
+    return count, newest
 
 def choose_latest_ready_folder(root: Path):
     """
     從 root 的直接子目錄中，挑選最近且已穩定（STABLE_SEC），且張數 >= MIN_IMAGES 的批次目錄
-    回傳: (folder_path, newest_mtime, num_images) 或 (None, 0.0, 0)
+    回傳: (folder_path, newest_mtime, num_images, pending) 或 (None, 0.0, 0, pending)
+    pending: 有目錄因為還在寫入（未穩定）而略過；呼叫端應在短時間內重新檢查
+
+    目錄本身的 mtime 在新增/刪除/改名檔案時會更新，可視為目錄內影像 mtime 的上限：
+    依目錄 mtime 由新到舊逐一檢查，一旦剩下的目錄 mtime 已不可能超過目前最佳者就停止，
+    較舊的批次目錄不必逐檔 stat。
     """
-    best = (None, 0.0, 0)
+    best, pending = (None, 0.0, 0), False
     try:
-        subs = [p for p in root.iterdir() if p.is_dir()]
+        with os.scandir(root) as it:
+            subs = []
+            for e in it:
+                try:
+                    if e.is_dir():
+                        subs.append((e.stat().st_mtime, e))
+                except FileNotFoundError:
+                    continue
     except FileNotFoundError:
-        return best
+        return (*best, pending)
+    subs.sort(key=lambda t: t[0], reverse=True)
 
     now = time.time()
-    for d in subs:
-        imgs = list_images(d)
-        n = len(imgs)
+    for dir_m, d in subs:
+        # 檔案內容寫入會比建立（目錄 mtime 更新）稍晚，留 DIR_MTIME_SLACK 的餘裕
+        if best[0] is not None and dir_m + DIR_MTIME_SLACK <= best[1]:
+            break
+        n, m = _scan_folder(d.path)
         if n < MIN_IMAGES:
             if DEBUG: log(f"Skip {d.name}: only {n} images (<{MIN_IMAGES})")
+            pending |= now - dir_m < STABLE_SEC   # 剛建立、影像尚未寫入完
             continue
-        m = newest_image_mtime(d)
         if m == 0.0:
             if DEBUG: log(f"Skip {d.name}: no image mtime")
             continue
         age = now - m
         if age < STABLE_SEC:
             if DEBUG: log(f"Skip {d.name}: not stable yet (age {age:.1f}s < {STABLE_SEC}s)")
+            pending = True
             continue
         if m > best[1]:
-            best = (d, m, n)
-    return best
+            best = (Path(d.path), m, n)
+    return (*best, pending)
+
+def make_watcher(root: Path):
+    """在 root（不遞迴）上監看子目錄的建立/移入。無法使用 inotify 時回傳 None（輪詢）。"""
+    if INotify is None:
+        warn(f"inotify_simple not installed; polling every {SLEEP_SEC}s")
+        return None
+    try:
+        watcher = INotify()
+        watcher.add_watch(str(root), flags.CREATE | flags.MOVED_TO)
+        return watcher
+    except Exception as e:
+        warn(f"inotify unavailable ({e}); polling every {SLEEP_SEC}s")
+        return None
 
-def append_csv(logfile: Path, rows):
-    new_file = not logfile.exists()
-    with logfile.open("a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
+def wait_for_change(watcher, pending: bool = False):
+    """
+    取代固定的 time.sleep(SLEEP_SEC)。
+    inotify 模式：阻塞直到 root 下有子目錄建立/移入，並在最後一個事件後再等 STABLE_SEC
+    （debounce）才返回；閒置時不掃描任何目錄。最長 RESCAN_SEC 仍會返回一次做保險掃描。
+    pending=True（有目錄還在寫入、或剛處理完一個目錄）時，目錄內的檔案變化不會產生事件，
+    所以最多 min(STABLE_SEC, SLEEP_SEC) 後就返回重新檢查（同輪詢模式）。
+    """
+    if watcher is None:
+        time.sleep(SLEEP_SEC)
+        return
+    deadline = time.monotonic() + (min(STABLE_SEC, SLEEP_SEC) if pending else RESCAN_SEC)
+    while _running:
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        # 最多每 SLEEP_SEC 醒來一次，只為了檢查 _running（SIGTERM）
+        for ev in watcher.read(timeout=int(min(deadline - now, SLEEP_SEC) * 1000)):
+            if ev.mask & (flags.ISDIR | flags.Q_OVERFLOW):
+                if DEBUG: log(f"inotify: {ev.name or 'overflow'}")
+                deadline = time.monotonic() + STABLE_SEC
+
+# ======== 偵測結果 sidecar 標記（<image>.det："YES|NO<TAB>score<TAB>threshold"）========
+def _det_mark_path(p: Path) -> Path:
+    return p.with_suffix(p.suffix + DETECT_MARK_EXT)
+
+def read_detect_mark(img: Path):
+    """標記比影像新、且是以相同 THRESHOLD 產生時回傳 (human, score)，否則 None"""
+    mark = _det_mark_path(img)
+    try:
+        if mark.stat().st_mtime < img.stat().st_mtime:
+            return None
+        flag, score, thr = mark.read_text().split("\t")
+        if float(thr) != THRESHOLD:
+            return None
+        return flag == "YES", float(score)
+    except (OSError, ValueError):
+        return None
+
+def write_detect_mark(img: Path, human: bool, score: float):
+    """tmp 檔寫完再 os.replace，避免中途當機留下半個標記"""
+    mark = _det_mark_path(img)
+    tmp = mark.with_name(mark.name + ".tmp")
+    try:
+        tmp.write_text(f"{'YES' if human else 'NO'}\t{score:.4f}\t{THRESHOLD}\n")
+        os.replace(tmp, mark)
+    except Exception as e:
+        warn(f"Failed to write mark {mark}: {e}")
+
+# ======== 每日 CSV（檔案保持開啟，UTC 換日時輪替）========
+_LOG_DAY    = None
+_LOG_PATH   = None
+_LOG_FP     = None
+_LOG_WRITER = None
+
+def close_csv():
+    global _LOG_DAY, _LOG_PATH, _LOG_FP, _LOG_WRITER
+    if _LOG_FP is not None:
+        try: _LOG_FP.close()
+        except Exception as e: warn(f"Failed to close {_LOG_PATH}: {e}")
+    _LOG_DAY = _LOG_PATH = _LOG_FP = _LOG_WRITER = None
+atexit.register(close_csv)
+
+def _get_writer(now_utc: datetime):
+    global _LOG_DAY, _LOG_PATH, _LOG_FP, _LOG_WRITER
+    day = now_utc.strftime("%Y%m%d")
+    if day != _LOG_DAY:
+        close_csv()
+        path = LOGS_ROOT / f"events_{day}.csv"
+        new_file = not path.exists()
+        _LOG_FP = path.open("a", newline="", encoding="utf-8")
+        _LOG_WRITER = csv.writer(_LOG_FP)
         if new_file:
-            w.writerow(["utc_time", "folder", "image", "human", "confidence"])
-        w.writerows(rows)
+            _LOG_WRITER.writerow(["utc_time", "folder", "image", "human", "confidence"])
+        _LOG_DAY, _LOG_PATH = day, path
+    return _LOG_WRITER
+
+_CSV_SPECIAL = frozenset(',"\r\n')
+
+def _csv_plain(s: str) -> bool:
+    """不含需要 quoting 的字元（csv.writer 會原樣輸出）"""
+    return _CSV_SPECIAL.isdisjoint(s)
+
+def append_csv(rows, now_utc: datetime = None) -> Path:
+    """
+    寫入一批 rows 並 flush 一次，回傳目前的 CSV 路徑。
+    row 為已格式化好的 str（含 \r\n，與 csv.writer 相同）或欄位 list（交給 csv.writer）。
+    """
+    writer = _get_writer(now_utc or datetime.utcnow())
+    if all(isinstance(r, str) for r in rows):
+        _LOG_FP.write("".join(rows))
+    else:
+        for r in rows:
+            if isinstance(r, str):
+                _LOG_FP.write(r)
+            else:
+                writer.writerow(r)
+    _LOG_FP.flush()
+    return _LOG_PATH
+
+def load_interpreters(num_tpus: int):
+    """
+    每個 EdgeTPU 建立一個 interpreter（device=":i"），並快取輸入 tensor 的 accessor/尺寸。
+    num_tpus <= 1 時沿用預設裝置。重複呼叫時直接回傳同一組。
+    回傳: [(interpreter, in_tensor), ...]
+    """
+    global _IN_SIZE
+    if _ENGINES:
+        return _ENGINES
+    devices = [f":{i}" for i in range(num_tpus)] if num_tpus > 1 else [None]
+    for dev in devices:
+        interpreter = make_interpreter(MODEL_PATH, device=dev)
+        interpreter.allocate_tensors()
+        d = interpreter.get_input_details()[0]
+        if d["dtype"] != np.uint8:
+            raise RuntimeError(f"Model input must be uint8 (quantized), got {d['dtype']}")
+        _, h, w, _ = d["shape"]
+        _IN_SIZE = (int(w), int(h))
+        _ENGINES.append((interpreter, interpreter.tensor(d["index"])))
+    return _ENGINES
+
+def _fit_size(src_size, tile_size):
+    """等比例縮放 src_size 以放入 tile_size"""
+    w, h = src_size
+    s = min(tile_size[0] / w, tile_size[1] / h)
+    return (max(1, int(w * s)), max(1, int(h * s)))
+
+JPEG_SUFFIXES = (".jpg", ".jpeg")
+
+def _reduce_factor(src_size, fit) -> int:
+    """JPEG 解碼時的 DCT 縮放倍率：解碼後仍不小於 fit 的最大 1/r（同 PIL 的 draft）"""
+    if not src_size:
+        return 1
+    for r in (8, 4, 2):
+        if src_size[0] // r >= fit[0] and src_size[1] // r >= fit[1]:
+            return r
+    return 1
+
+def _put_rgb(out, x, y, img, size):
+    """把 RGB uint8 影像縮放到 size，直接寫進 out 在 (x, y) 的區域"""
+    h, w = img.shape[:2]
+    view = out[y:y + size[1], x:x + size[0]]
+    if (w, h) == size:
+        view[...] = img
+    elif cv2 is not None:
+        cv2.resize(img, size, dst=view, interpolation=cv2.INTER_LINEAR)
+    else:
+        view[...] = np.asarray(Image.fromarray(img).resize(size, Image.BILINEAR))
+
+def prepare_tiles(image_paths, in_size, grid: int = 1, src_size=None, out=None):
+    """
+    （CPU 端）解碼、縮放並把最多 grid*grid 張影像依序拼貼（tile）成一張模型輸入。
+    EdgeTPU 不支援 batch>1，改用空間拼貼來攤提 USB 傳輸與 TPU 啟動的開銷。
+    grid=1 時等同原本的單張推論（等比例縮放、左上對齊）。
+    src_size: 該資料夾影像的 (w, h)（同一台相機整批相同），縮放尺寸只算一次；尺寸不同的影像個別計算
+    out: 重複使用的 uint8 ndarray[h, w, 3]（見 iter_detections 的緩衝池）；None 時另配置
+    回傳: (uint8 ndarray[h, w, 3], 讀圖失敗的 index 集合)
+    """
+    in_w, in_h = in_size
+    tile_w, tile_h = in_w // grid, in_h // grid
+    fit = _fit_size(src_size, (tile_w, tile_h)) if src_size else None
+    if out is None:
+        out = np.zeros((in_h, in_w, 3), np.uint8)
+    else:
+        out.fill(0)   # 留白/讀圖失敗的 tile 要是黑色（同原本的空白畫布）
+    r = _reduce_factor(src_size, fit)
+    expect = (-(-src_size[0] // r), -(-src_size[1] // r)) if src_size else None
+    if cv2 is not None:
+        flag = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                2: cv2.IMREAD_REDUCED_COLOR_2}.get(r, cv2.IMREAD_COLOR)
+    failed = set()
+    for k, path in enumerate(image_paths):
+        x, y = (k % grid) * tile_w, (k // grid) * tile_h
+        try:
+            img = None
+            if _TJ is not None and _has_suffix(path.name, JPEG_SUFFIXES):
+                # libjpeg-turbo 直接解碼成 RGB（同時做 DCT 縮放），不需要 convert("RGB") 的第二次轉換
+                try:
+                    with open(path, "rb") as f:
+                        img = _TJ.decode(f.read(), pixel_format=TJPF_RGB, scaling_factor=(1, r))
+                except Exception as te:   # 截斷、CMYK 等 turbojpeg 不接受的檔案改走 cv2/PIL
+                    if DEBUG: log(f"turbojpeg failed on {path} ({te}); falling back")
+                    img = None
+            if img is not None:
+                h, w = img.shape[:2]
+                _put_rgb(out, x, y, img, fit if (w, h) == expect else _fit_size((w, h), (tile_w, tile_h)))
+            elif cv2 is not None:
+                # JPEG 以 IMREAD_REDUCED_* 在解碼階段做 DCT 縮放；縮放結果直接寫進緩衝區對應的 tile
+                img = cv2.imread(str(path), flag)
+                if img is None:
+                    raise ValueError("cv2.imread failed")
+                h, w = img.shape[:2]
+                cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+                _put_rgb(out, x, y, img, fit if (w, h) == expect else _fit_size((w, h), (tile_w, tile_h)))
+            else:
+                img = Image.open(path)
+                size = fit if img.size == src_size else _fit_size(img.size, (tile_w, tile_h))
+                # JPEG 在解碼階段就以 DCT 縮放（1/2、1/4、1/8）到不小於目標的尺寸，省去全解析度解碼
+                img.draft("RGB", size)
+                img = img.convert("RGB")
+                # 偵測模型以 bilinear 前處理訓練，LANCZOS 慢數倍且無助於準確度
+                if img.size != size:
+                    img = img.resize(size, Image.BILINEAR)
+                out[y:y + size[1], x:x + size[0]] = np.asarray(img)
+        except Exception as e:
+            warn(f"Failed to load {path}: {e}")
+            if DEBUG: traceback.print_exc()
+            failed.add(k)
+    return out, failed
+
+def detect_person_scores_batch(engine, person_ids, tiles, n: int, threshold: float, grid: int = 1):
+    """
+    （TPU 端）對 prepare_tiles() 的結果只呼叫一次 invoke，再依偵測框中心點所在的 tile 分回各影像。
+    engine: load_interpreters() 回傳的其中一組 (interpreter, in_tensor)
+    回傳: 長度 n 的 list，元素為 (found, max_score)；讀圖失敗者為 None
+    """
+    interpreter, in_tensor = engine
+    arr, failed = tiles
+    in_w, in_h = _IN_SIZE
+    tile_w, tile_h = in_w // grid, in_h // grid
+    results = [None if k in failed else (False, 0.0) for k in range(n)]
 
-def detect_person_score(interpreter, labels, image_path: Path, threshold: float):
-    img = Image.open(image_path).convert("RGB")
-    _, scale = common.set_resized_input(
-        interpreter, img.size, lambda size: img.resize(size, Image.LANCZOS))
+    np.copyto(in_tensor()[0], arr)   # 暫時的 view，invoke 前即釋放
     interpreter.invoke()
-    objs = detect.get_objects(interpreter, score_threshold=threshold, image_scale=scale)
-    found, max_score = False, 0.0
+    # image_scale=(1,1)：偵測框座標即為模型輸入上的像素座標
+    objs = detect.get_objects(interpreter, score_threshold=threshold, image_scale=(1.0, 1.0))
     for o in objs:
-        if labels.get(o.id, str(o.id)).lower() == "person":
-            found = True
-            if o.score > max_score:
-                max_score = o.score
-    return found, max_score
+        if o.id not in person_ids:
+            continue
+        col = min(grid - 1, max(0, int((o.bbox.xmin + o.bbox.xmax) / 2 // tile_w)))
+        row = min(grid - 1, max(0, int((o.bbox.ymin + o.bbox.ymax) / 2 // tile_h)))
+        k = row * grid + col
+        if k >= n or results[k] is None:
+            continue
+        if o.score > results[k][1]:
+            results[k] = (True, o.score)
+    return results
+
+def _chunks(items, n):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, n))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_detections(engines, person_ids, images, threshold: float, grid: int = 1, src_size=None):
+    """
+    管線：背景 thread 先解碼/縮放下一批（prepare_tiles），同時讓 TPU 推論目前這批。
+    每個 TPU 各有一個專用的推論 thread，各自從同一個佇列取批次（單一 TPU 非 thread-safe，
+    不同裝置之間互不影響），誰空下來誰就拿下一批。Queue(maxsize=2) 限制預先準備的批數以控制記憶體；
+    輸入緩衝區由 free 池循環使用，不必每批重新配置（佇列中 2 + producer 1 + 每個 TPU 推論中 1）。
+    yield: (chunk, results)，依完成順序；results 同 detect_person_scores_batch，整批失敗時全為 None
+    """
+    in_size = _IN_SIZE
+    q = queue.Queue(maxsize=2)
+    out = queue.Queue()
+    free = queue.Queue()
+    for _ in range(q.maxsize + 1 + len(engines)):
+        free.put(np.zeros((in_size[1], in_size[0], 3), np.uint8))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(src):
+        """停止（呼叫端 close）時回傳 None"""
+        while not stop.is_set():
+            try:
+                return src.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        return None
+
+    def producer():
+        for chunk in _chunks(images, grid * grid):
+            buf = get(free)
+            if buf is None:
+                return
+            try:
+                item = (chunk, prepare_tiles(chunk, in_size, grid, src_size, buf), None)
+            except Exception as e:
+                free.put(buf)
+                item = (chunk, None, e)
+            if not put(item):
+                return
+        for _ in engines:   # 每個推論 thread 一個結束標記
+            put(None)
+
+    def tpu_worker(engine):
+        while True:
+            item = get(q)
+            if item is None:
+                out.put(None)
+                return
+            chunk, tiles, e = item
+            results = None
+            if e is None:
+                try:
+                    results = detect_person_scores_batch(engine, person_ids, tiles, len(chunk), threshold, grid)
+                except Exception as ie:
+                    e = ie
+                finally:
+                    free.put(tiles[0])   # 已複製進 input tensor（或失敗），可交回給 producer
+            out.put((chunk, results, e))
+
+    threads = [threading.Thread(target=producer, daemon=True)]
+    threads += [threading.Thread(target=tpu_worker, args=(eng,), daemon=True) for eng in engines]
+    for t in threads:
+        t.start()
+    try:
+        remaining = len(engines)
+        while remaining:
+            item = out.get()
+            if item is None:
+                remaining -= 1
+                continue
+            chunk, results, e = item
+            if e is not None:
+                results = [None] * len(chunk)
+                warn(f"Failed on {chunk[0]} (+{len(chunk) - 1}): {e}")
+                if DEBUG: traceback.print_exception(type(e), e, e.__traceback__)
+            yield chunk, results
+    finally:
+        stop.set()
+        for t in threads:   # 呼叫端中途 close() 時，各 thread 最多再做完手上這一批即結束
+            t.join()
 
 def move_folder(src: Path, dst_parent: Path) -> Path:
     ensure_dir(dst_parent)
@@ -137,6 +556,18 @@ def move_folder(src: Path, dst_parent: Path) -> Path:
 def _mark_path(p: Path) -> Path:
     return p.with_suffix(p.suffix + UPLOAD_MARK_EXT)
 
+# 整個 process 共用一個 Session：保持與 Google 的 HTTPS keep-alive，不必每張重新 fork + TLS 握手
+# UPLOAD_RETRIES 為總嘗試次數（同舊的 helper 呼叫迴圈）。
+# POST 只在連線建立失敗（請求尚未送出）時重試：逾時或 5xx 時 Web App 可能已經存好檔案，
+# 重送會在 Drive 產生重複檔案。/exec 的 POST 會 302 轉到 GET 取回結果，該 GET 可安全重試。
+_RETRIES = max(0, UPLOAD_RETRIES - 1)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(8, UPLOAD_WORKERS), max_retries=Retry(
+    total=_RETRIES, connect=_RETRIES, read=_RETRIES, status=_RETRIES, backoff_factor=2,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}),   # read/status 的重試只給 GET；connect 錯誤不分 method 都會重試
+    raise_on_status=False)))
+
 def upload_image_to_drive(img_path: Path) -> bool:
     if not UPLOAD_ENABLED:
         if DEBUG: log(f"Upload disabled, skipping: {img_path}")
@@ -152,21 +583,21 @@ def upload_image_to_drive(img_path: Path) -> bool:
         if DEBUG: log(f"Already uploaded (mark exists): {img_path}")
         return True
 
-    cmd = [GAS_UPLOAD_HELPER, GAS_UPLOAD_URL, str(img_path)]
-    for attempt in range(UPLOAD_RETRIES):
-        try:
-            rc = subprocess.run(cmd, check=False)
-            if rc.returncode == 0:
-                try: mark.touch(exist_ok=True)
-                except Exception as me: warn(f"Failed to write mark: {me}")
-                if DEBUG: log(f"Uploaded: {img_path}")
-                return True
-            time.sleep(2 * (attempt + 1))
-        except Exception as e:
-            warn(f"Upload exception ({img_path}): {e}")
-            if DEBUG: traceback.print_exc()
-            time.sleep(2 * (attempt + 1))
-    err(f"Upload failed after {UPLOAD_RETRIES} tries: {img_path}")
+    # 與 script.new 的 doPost 相同格式：body 為 base64，檔名放在 ?filename=
+    try:
+        body = base64.b64encode(img_path.read_bytes())
+        r = _SESSION.post(GAS_UPLOAD_URL, params={"filename": img_path.name}, data=body,
+                          headers={"Content-Type": "application/octet-stream"},
+                          timeout=UPLOAD_TIMEOUT)
+        if r.ok and not r.text.startswith("ERR"):
+            try: mark.touch(exist_ok=True)
+            except Exception as me: warn(f"Failed to write mark: {me}")
+            if DEBUG: log(f"Uploaded: {img_path} ({r.text.strip()[:80]})")
+            return True
+        err(f"Upload failed ({img_path}): HTTP {r.status_code} {r.text.strip()[:200]}")
+    except Exception as e:
+        err(f"Upload failed ({img_path}): {e}")
+        if DEBUG: traceback.print_exc()
     return False
 
 def main():
@@ -186,58 +617,96 @@ def main():
         log(f"EdgeTPUs found: {tpus}")
 
     labels = read_label_file(LABELS_PATH)
-    interpreter = make_interpreter(MODEL_PATH)
-    interpreter.allocate_tensors()
-    log("Interpreter ready.")
-
+    # 只關心 person：啟動時先換成 class id 集合，後處理迴圈內只做整數的集合查詢
+    person_ids = frozenset(i for i, name in labels.items() if name.lower() == "person")
+    if not person_ids:
+        warn(f"No 'person' label in {LABELS_PATH}; nothing will be detected")
+    engines = load_interpreters(len(tpus))
+    log(f"Interpreter ready. input={_IN_SIZE[0]}x{_IN_SIZE[1]} tpus={len(engines)}")
+    log(f"Decoder: jpeg={'turbojpeg' if _TJ is not None else 'cv2' if cv2 is not None else 'PIL'} "
+        f"other={'cv2' if cv2 is not None else 'PIL'}")
+
+    watcher = make_watcher(DATA_ROOT)
     state = read_state()
-    log(f"Watching {DATA_ROOT} | thr={THRESHOLD} stable={STABLE_SEC}s sleep={SLEEP_SEC}s min_imgs={MIN_IMAGES}")
+    log(f"Watching {DATA_ROOT} | thr={THRESHOLD} stable={STABLE_SEC}s sleep={SLEEP_SEC}s inotify={watcher is not None} min_imgs={MIN_IMAGES} tile={TILE_GRID}x{TILE_GRID}")
     if state: log(f"Loaded state: {state}")
 
     global _running
     while _running:
         try:
-            folder, newest_m, count = choose_latest_ready_folder(DATA_ROOT)
+            folder, newest_m, count, pending = choose_latest_ready_folder(DATA_ROOT)
             if not folder:
                 if DEBUG: log("No ready folder.")
-                time.sleep(SLEEP_SEC); continue
+                wait_for_change(watcher, pending); continue
 
             last = state.get("last")
             last_m = state.get("last_mtime")
             if last == folder.name and last_m == newest_m:
                 if DEBUG: log(f"Skip {folder.name}: already processed.")
-                time.sleep(SLEEP_SEC); continue
+                wait_for_change(watcher, pending); continue
 
             images = list_images(folder)
             log(f"Scanning {folder.name}: {len(images)} images (age {(time.time()-newest_m):.1f}s)")
             rows, folder_has_person = [], False
             person_imgs = []
 
-            for i, img in enumerate(images, 1):
-                try:
-                    human, score = detect_person_score(interpreter, labels, img, THRESHOLD)
+            # 已有有效 .det 標記的影像直接沿用結果，不再送 TPU（重新掃描時只推論缺的部分）
+            found = {}
+            for img in images:
+                res = read_detect_mark(img)
+                if res is not None:
+                    found[img] = res
+            todo = [img for img in images if img not in found]
+            if found: log(f"Reusing {len(found)} cached results ({DETECT_MARK_EXT}), inferring {len(todo)}")
+
+            # 同一批次來自同一台相機：以第一張的尺寸決定整批的縮放尺寸
+            try:
+                with Image.open(todo[0]) as first:
+                    src_size = first.size
+            except Exception:
+                src_size = None
+            hit = EARLY_EXIT and any(res is not None and res[0] for res in found.values())
+            done = 0
+            detections = iter_detections(engines, person_ids, todo, THRESHOLD, TILE_GRID, src_size)
+            try:
+                for chunk, results in (() if hit else detections):
+                    for img, res in zip(chunk, results):
+                        found[img] = res
+                        if res is not None:
+                            write_detect_mark(img, *res)
+                            hit |= res[0]
+                    prev, done = done, done + len(chunk)
+                    if DEBUG and (done // 20 > prev // 20 or done == len(todo)):
+                        log(f"...processed {done}/{len(todo)}")
+                    if EARLY_EXIT and hit:
+                        if done < len(todo): log(f"PERSON found; EARLY_EXIT skips the remaining {len(todo) - done} images")
+                        break
+            finally:
+                detections.close()   # EARLY_EXIT 的 break 後也立即停止 producer/推論 thread（未開始的 generator 則不做事）
+
+            # 整批共用一個時間戳（rows 在推論結束後才一次建立）；CSV 檔也依同一時間決定日期
+            now_utc = datetime.utcnow()
+            ts = now_utc.isoformat(timespec="seconds") + "Z"
+            # 名稱不含 CSV 特殊字元時直接組字串，省去 csv 模組逐欄位的 quoting 判斷
+            prefix = None if CSV_STRICT or not _csv_plain(folder.name) else f"{ts},{folder.name},"
+            for img in images:
+                if img not in found:   # EARLY_EXIT 而未推論
+                    status, conf = "SKIPPED", ""
+                elif found[img] is None:
+                    status, conf = "ERROR", ""
+                else:
+                    human, score = found[img]
                     folder_has_person |= human
                     if human:
                         person_imgs.append(img)
-                    rows.append([
-                        datetime.utcnow().isoformat(timespec="seconds") + "Z",
-                        folder.name, img.name,
-                        "YES" if human else "NO",
-                        f"{score:.4f}",
-                    ])
-                    if DEBUG and (i % 20 == 0 or i == len(images)):
-                        log(f"...processed {i}/{len(images)}")
-                except Exception as e:
-                    rows.append([
-                        datetime.utcnow().isoformat(timespec="seconds") + "Z",
-                        folder.name, img.name, "ERROR", ""
-                    ])
-                    warn(f"Failed on {img}: {e}")
-                    if DEBUG: traceback.print_exc()
+                    status, conf = ("YES" if human else "NO"), f"{score:.4f}"
+                if prefix is not None and _csv_plain(img.name):
+                    rows.append(f"{prefix}{img.name},{status},{conf}\r\n")
+                else:
+                    rows.append([ts, folder.name, img.name, status, conf])
 
             # CSV
-            log_file = LOGS_ROOT / f"events_{datetime.utcnow().strftime('%Y%m%d')}.csv"
-            append_csv(log_file, rows)
+            log_file = append_csv(rows, now_utc)
             log(f"Wrote {len(rows)} rows to {log_file.name}")
 
             if folder_has_person:
@@ -246,10 +715,11 @@ def main():
 
                 # 僅上傳偵測為 PERSON 的影像
                 uploaded = 0
-                for old in person_imgs:
-                    new_path = dst / old.name
-                    if upload_image_to_drive(new_path):
-                        uploaded += 1
+                with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                    futs = [pool.submit(upload_image_to_drive, dst / old.name) for old in person_imgs]
+                    for fut in as_completed(futs):
+                        if fut.result():
+                            uploaded += 1
                 log(f"Uploaded {uploaded}/{len(person_imgs)} PERSON images to Drive Web App")
 
                 state.update({"last": folder.name, "last_mtime": newest_m, "result": "moved"})
@@ -258,13 +728,14 @@ def main():
                 state.update({"last": folder.name, "last_mtime": newest_m, "result": "no_person"})
 
             write_state(state)
-            time.sleep(SLEEP_SEC)
+            wait_for_change(watcher, pending=True)   # 其他已就緒的目錄不必等到下次保險掃描
 
         except Exception as e:
             err(f"Loop error: {e}")
             if DEBUG: traceback.print_exc()
             time.sleep(SLEEP_SEC)
 
+    close_csv()
     log("Worker exiting.")
 
 if __name__ == "__main__":